@@ -1,8 +1,15 @@
 import os
-import json
+import re
+import sys
+import time
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+import httpx
+import orjson
 from dotenv import load_dotenv
 from rich.console import Console
 from openai import OpenAI
@@ -16,19 +23,33 @@ if not api_key:
 
 model = os.getenv("OPENROUTER_MODEL", "google/gemini-2.0-flash-lite-001")
 
+# One pooled HTTP/2 client so TLS and TCP are reused across requests
+http_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=8, max_connections=16),
+    timeout=httpx.Timeout(30.0, connect=5.0),
+)
+
 client = OpenAI(
     base_url="https://openrouter.ai/api/v1",
     api_key=api_key,
+    http_client=http_client,
     default_headers={
         "HTTP-Referer": "http://localhost",  # optional
         "X-Title": "Jarvis CLI",             # optional
     },
 )
 
+def _dumps(obj) -> str:
+    """Serializes to a JSON str with orjson (tool results need str)."""
+    return orjson.dumps(obj).decode()
+
 # ---- Tool implementations ----
+JAKARTA_TZ = ZoneInfo("Asia/Jakarta")
+
 def get_current_datetime() -> dict:
-    tz = "Asia/Jakarta"  # hardcoded so it cannot be overridden
-    dt = datetime.now(ZoneInfo(tz))
+    tz = JAKARTA_TZ.key  # hardcoded so it cannot be overridden
+    dt = datetime.now(JAKARTA_TZ)
     nice = f"It is {dt:%A}, {dt.day} {dt:%B} {dt:%Y}, {dt:%H:%M:%S} ({tz})"
     return {
         "text": nice,
@@ -41,6 +62,15 @@ def dispatch_tool(name: str, args: dict) -> dict:
         return get_current_datetime()
     raise ValueError(f"Unknown tool: {name}")
 
+def run_tool_call(tc: dict) -> dict:
+    """Run one tool call; failures (unknown tool, bad arguments) come back as an error result."""
+    try:
+        return dispatch_tool(tc["function"]["name"], orjson.loads(tc["function"]["arguments"] or "{}"))
+    except Exception as e:
+        return {"error": str(e)}
+
+tool_executor = ThreadPoolExecutor(max_workers=4)
+
 TOOLS = [
     {
         "type": "function",
@@ -55,19 +85,133 @@ TOOLS = [
         },
     }
 ]
+TOOL_KWARGS = {"tools": TOOLS, "tool_choice": "auto"}
+# Providers expect the schemas on every request whose history holds tool traffic
+TOOL_KWARGS_NO_CALLS = {"tools": TOOLS, "tool_choice": "none"}
 
 system_prompt = (
     "Your name is Jarvis. You have a joking sarcastic personality and are an AI designed "
     "to help me with technical knowledge as well as day to day task. Address me as Sir "
     "and speak in a British accent. Also keep replies short.\n\n"
     "Tool use:\n"
-    "- If the user asks for the current date or time (or 'today'), call get_current_datetime.\n"
+    "- If the message carries the current date and time as Context, answer from that.\n"
+    "- Otherwise, if the user asks for the current date or time, call get_current_datetime.\n"
 )
 
-messages = [{"role": "system", "content": system_prompt}]
+# The cache breakpoint lets providers that support prompt caching reuse the system prompt
+messages = [
+    {
+        "role": "system",
+        "content": [
+            {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}},
+        ],
+    }
+]
 
 MAX_TOOL_ROUNDS = 3
 
+# ---- History window ----
+HISTORY_MAX_TURNS = 12
+HISTORY_KEEP_TURNS = 6
+
+def trim_history():
+    """Keep the last few turns verbatim and fold older ones into a rolling summary."""
+    turn_starts = [i for i, m in enumerate(messages) if m["role"] == "user"]
+    if len(turn_starts) <= HISTORY_MAX_TURNS:
+        return
+
+    # Cut on a user message so tool calls stay paired with their results
+    cut = turn_starts[-HISTORY_KEEP_TURNS]
+    old, recent = messages[1:cut], messages[cut:]
+
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in old if m.get("content"))
+    resp = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": "Summarize as bullet facts"},
+            {"role": "user", "content": transcript},
+        ],
+    )
+    summary = (resp.choices[0].message.content or "").strip()
+    messages[1:] = [{"role": "system", "content": f"Prior-context summary: {summary}"}] + recent
+
+# Date/time questions are answered locally, skipping the tool round-trip
+DATE_RE = re.compile(r"\b(date|today|time|what day)\b", re.I)
+
+# ---- Response cache ----
+RESPONSE_CACHE_SIZE = 128
+RESPONSE_CACHE_TTL = 600  # seconds
+response_cache = OrderedDict()  # key -> (timestamp, reply)
+
+def response_cache_key(text: str, previous: dict) -> str:
+    """Key on the question and the message it follows, so context-dependent follow-ups don't cross conversations."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(orjson.dumps([model, " ".join(text.casefold().split()), previous.get("content") or ""]))
+    return digest.hexdigest()
+
+def get_cached_response(key: str) -> str | None:
+    entry = response_cache.get(key)
+    if entry is None:
+        return None
+    stamp, text = entry
+    if time.monotonic() - stamp > RESPONSE_CACHE_TTL:
+        del response_cache[key]
+        return None
+    response_cache.move_to_end(key)
+    return text
+
+def cache_response(key: str, text: str):
+    response_cache[key] = (time.monotonic(), text)
+    response_cache.move_to_end(key)
+    while len(response_cache) > RESPONSE_CACHE_SIZE:
+        response_cache.popitem(last=False)
+
+# ---- Streaming output ----
+def stream_reply(**kwargs) -> dict:
+    """Stream a completion to stdout and return it as an assistant message."""
+    content = []
+    buf = []
+    tool_calls = {}
+
+    for chunk in client.chat.completions.create(stream=True, **kwargs):
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        # Tool calls arrive as fragments keyed by index
+        for tc in delta.tool_calls or []:
+            call = tool_calls.setdefault(
+                tc.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+            )
+            if tc.id:
+                call["id"] = tc.id
+            if tc.function and tc.function.name:
+                call["function"]["name"] += tc.function.name
+            if tc.function and tc.function.arguments:
+                call["function"]["arguments"] += tc.function.arguments
+
+        if delta.content:
+            if not content:
+                console.print("[bold green]Jarvis:[/bold green] ", end="")
+            content.append(delta.content)
+            buf.append(delta.content)
+            # Flush on token boundaries rather than on every fragment
+            if delta.content.endswith((" ", "\n", ".", "!", "?")):
+                sys.stdout.write("".join(buf))
+                sys.stdout.flush()
+                buf.clear()
+
+    if buf:
+        sys.stdout.write("".join(buf))
+    if content:
+        sys.stdout.write("\n\n")
+    sys.stdout.flush()
+
+    msg = {"role": "assistant", "content": "".join(content)}
+    if tool_calls:
+        msg["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+    return msg
+
 while True:
     try:
         user_input = console.input("[bold]You:[/bold] ")
@@ -76,49 +220,71 @@ while True:
             print("Ending chat. Goodbye!")
             break
 
-        messages.append({"role": "user", "content": user_input})
+        # The datetime rides on the user message so the system prefix never changes
+        needs_date = bool(DATE_RE.search(user_input))
+        # Date answers carry the current time, so they are never reused
+        key = None if needs_date else response_cache_key(user_input, messages[-1])
+        if needs_date:
+            user_input = f"{user_input}\n\nContext: {get_current_datetime()['text']}"
 
-        final_text = None
+        messages.append({"role": "user", "content": user_input})
+        if not needs_date:
+            tool_kwargs = TOOL_KWARGS
+        elif any(m["role"] == "tool" for m in messages):
+            tool_kwargs = TOOL_KWARGS_NO_CALLS
+        else:
+            tool_kwargs = {}
 
-        for _ in range(MAX_TOOL_ROUNDS):
-            resp = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                tools=TOOLS,
-                tool_choice="auto",
-            )
+        final_text = get_cached_response(key) if key else None
+        used_tools = False
+        streamed = False
 
-            msg = resp.choices[0].message
+        if final_text is not None:
+            messages.append({"role": "assistant", "content": final_text})
+        else:
+            for _ in range(MAX_TOOL_ROUNDS):
+                msg = stream_reply(
+                    model=model,
+                    messages=messages,
+                    **tool_kwargs,
+                )
 
-            # Important: add the assistant message to history (includes tool_calls if any)
-            messages.append(msg.model_dump(exclude_none=True))
+                # Important: add the assistant message to history (includes tool_calls if any)
+                messages.append(msg)
 
-            # If the model requested tool calls, execute them and continue the loop
-            if msg.tool_calls:
-                for tc in msg.tool_calls:
-                    tool_name = tc.function.name
-                    tool_args = json.loads(tc.function.arguments or "{}")
+                # If the model requested tool calls, execute them and continue the loop
+                if msg.get("tool_calls"):
+                    used_tools = True
+                    # Run independent calls concurrently; map keeps the original order
+                    results = tool_executor.map(run_tool_call, msg["tool_calls"])
 
-                    tool_result = dispatch_tool(tool_name, tool_args)
+                    for tc, tool_result in zip(msg["tool_calls"], results):
+                        # Tool result must be a string, JSON is a good pattern
+                        messages.append(
+                            {
+                                "role": "tool",
+                                "tool_call_id": tc["id"],
+                                "content": _dumps(tool_result),
+                            }
+                        )
+                    continue
 
-                    # Tool result must be a string, JSON is a good pattern
-                    messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": tc.id,
-                            "content": json.dumps(tool_result),
-                        }
-                    )
-                continue
+                # No tool calls, so we have the final assistant response
+                final_text = msg["content"].strip()
+                streamed = bool(final_text)
+                break
 
-            # No tool calls, so we have the final assistant response
-            final_text = (msg.content or "").strip()
-            break
+            # Don't cache answers that depended on tool results
+            if key and final_text and not used_tools:
+                cache_response(key, final_text)
 
         if not final_text:
             final_text = "Sorry Sir, I couldn't complete that request."
 
-        console.print(f"[bold green]Jarvis:[/bold green] {final_text}\n")
+        if not streamed:
+            console.print(f"[bold green]Jarvis:[/bold green] {final_text}\n")
+
+        trim_history()
 
     except KeyboardInterrupt:
         print("\nEnding chat. Cheerio!")
@@ -1,21 +1,31 @@
 # --- Core Imports ---
 import asyncio
-import base64
+import binascii
+import hashlib
+import html
+import inspect
 import os
+import re
 import sys
+import time
 import traceback
-import json
+import orjson
+import pyaudio
 import websockets
 import threading
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 # --- PySide6 GUI Imports ---
 from PySide6.QtWidgets import QApplication, QMainWindow, QTextEdit, QVBoxLayout, QWidget, QLineEdit
 from PySide6.QtCore import QObject, Signal, Slot
+from PySide6.QtGui import QTextCursor
+from qasync import QEventLoop
 
 # --- AI Imports ---
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
 # --- Load Environment Variables ---
@@ -30,9 +40,122 @@ if not ELEVENLABS_API_KEY:
 
 # --- Configuration ---
 RECEIVE_SAMPLE_RATE = 24000
+PLAYBACK_FRAMES_PER_BUFFER = 480  # 20 ms at 24 kHz
+PLAYBACK_COALESCE_CHUNKS = 4
 MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-2.0-flash-lite-001")
+# Model for turns that need no tools; defaults to MODEL
+CHAT_MODEL = os.getenv("OPENROUTER_CHAT_MODEL") or MODEL
 VOICE_ID = 'SnAS1AhU43gJHbuUJIdM'
 MAX_TOOL_ROUNDS = 3
+JAKARTA_TZ = ZoneInfo("Asia/Jakarta")
+HISTORY_MAX_TURNS = 12
+HISTORY_KEEP_TURNS = 6
+SUMMARY_INSTRUCTION = "Summarize as bullet facts"
+SENTENCE_END_RE = re.compile(r"[.!?]\s")
+CLAUSE_END_RE = re.compile(r"[,;:]\s")
+FIRST_PHRASE_MIN_CHARS = 24
+DATE_RE = re.compile(r"\b(date|today|time|what day)\b", re.I)
+# Time-related words DATE_RE leaves to the model; disjoint from it so hinted turns really get tools
+TOOL_HINT_RE = re.compile(r"\b(now|clock|hours?|minutes?|tomorrow|yesterday|weekday|timezone)\b", re.I)
+RESPONSE_CACHE_SIZE = 128
+RESPONSE_CACHE_TTL = 600  # seconds
+# Tools whose results may be reused, with how long (seconds) a result stays fresh
+TOOL_RESULT_TTLS = {"get_current_datetime": 5.0}
+CHAT_MAX_BLOCKS = 500
+TTS_QUEUE_SIZE = 8
+AUDIO_QUEUE_SIZE = 64  # ~2 s of 20 ms frames at 24 kHz
+PLAYBACK_BUFFER_MAX_BYTES = RECEIVE_SAMPLE_RATE * 2 * 2  # ~2 s of 16-bit mono PCM
+TTS_URI = (
+    f"wss://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}/stream-input"
+    "?model_id=eleven_flash_v2_5&output_format=pcm_24000&auto_mode=true&inactivity_timeout=60"
+)
+TTS_KEEPALIVE_SECONDS = 15
+TTS_BARGE_IN_SECONDS = 1.0  # audio this recent means the previous reply is still arriving
+TTS_MAX_BACKOFF_SECONDS = 30
+TTS_SEND_ATTEMPTS = 3  # after this many failures a message is dropped
+
+def _dumps(obj) -> str:
+    """Serializes to a JSON str with orjson (websocket text frames and tool results need str)."""
+    return orjson.dumps(obj).decode()
+
+# Fixed-shape TTS control messages, serialized once
+TTS_BOS_MESSAGE = _dumps({
+    "text": " ",
+    "voice_settings": {"stability": 0.5, "similarity_boost": 0.8},
+    "xi_api_key": ELEVENLABS_API_KEY,
+})
+TTS_KEEPALIVE_MESSAGE = _dumps({"text": " "})
+TTS_FLUSH_MESSAGE = _dumps({"text": " ", "flush": True})
+
+# --- Prompt & Tools (built once, reused every turn) ---
+SYSTEM_INSTRUCTION = (
+    "Your name is Jarvis. You have a joking sarcastic personality and are an AI designed "
+    "to help me with technical knowledge as well as day to day task. Address me as Sir "
+    "and speak in a British accent. Also keep replies short.\n\n"
+    "Tool use:\n"
+    "- If the message carries the current date and time as Context, answer from that.\n"
+    "- Otherwise, if the user asks for the current date or time, call get_current_datetime.\n"
+    "- To run multiple independent tools, use batch_call.\n"
+)
+
+# The system prompt carries a cache breakpoint so providers that support
+# prompt caching reuse it instead of re-processing it.
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": [{
+        "type": "text",
+        "text": SYSTEM_INSTRUCTION,
+        "cache_control": {"type": "ephemeral"},
+    }],
+}
+
+# OpenAI-style tool definitions
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_current_datetime",
+            "description": "Get the current date and time in Asia/Jakarta timezone.",
+            "parameters": {
+                "type": "object",
+                "properties": {},
+                "required": [],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "batch_call",
+            "description": "Run several independent tools in one step and return all of their results.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "invocations": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string", "description": "Name of the tool to call."},
+                                "args": {"type": "object", "description": "Arguments for the tool."},
+                            },
+                            "required": ["name"],
+                        },
+                    },
+                },
+                "required": ["invocations"],
+            },
+        },
+    },
+]
+TOOL_KWARGS = {"tools": TOOLS, "tool_choice": "auto"}
+# Providers expect the schemas on every request whose history holds tool traffic
+TOOL_KWARGS_NO_CALLS = {"tools": TOOLS, "tool_choice": "none"}
+# Argument names each tool declares; anything else the model sends is dropped
+TOOL_PARAMS = {t["function"]["name"]: set(t["function"]["parameters"]["properties"]) for t in TOOLS}
+
+# (expiry timestamp, formatted date) - the date part only changes at local midnight
+_DATE_CACHE: tuple[float, str] | None = None
 
 # ====
 # AI BACKEND LOGIC
@@ -40,7 +163,7 @@ MAX_TOOL_ROUNDS = 3
 class AI_Core(QObject):
     """
     Handles all backend operations. Inherits from QObject to emit signals
-    for thread-safe communication with the GUI.
+    to the GUI; runs on the Qt event loop through qasync.
     """
     text_received = Signal(str)
     end_of_turn = Signal()
@@ -49,67 +172,315 @@ class AI_Core(QObject):
         super().__init__()
         self.is_running = True
         
-        self.client = OpenAI(
+        # One pooled HTTP client so connections to OpenRouter stay alive across turns
+        self.client = AsyncOpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=OPENROUTER_API_KEY,
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=10),
+                timeout=httpx.Timeout(30.0, connect=5.0),
+            ),
             default_headers={
                 "HTTP-Referer": "http://localhost",
                 "X-Title": "Jarvis GUI",
             },
         )
         
-        self.system_instruction = (
-            "Your name is Jarvis. You have a joking sarcastic personality and are an AI designed "
-            "to help me with technical knowledge as well as day to day task. Address me as Sir "
-            "and speak in a British accent. Also keep replies short.\n\n"
-            "Tool use:\n"
-            "- If the user asks for the current date or time (or 'today'), call get_current_datetime.\n"
-        )
-        
-        self.response_queue_tts = asyncio.Queue()
-        self.audio_in_queue_player = asyncio.Queue()
+        # Bounded so a slow consumer applies backpressure instead of buffering megabytes of PCM
+        self.response_queue_tts = asyncio.Queue(maxsize=TTS_QUEUE_SIZE)
+        self.audio_in_queue_player = asyncio.Queue(maxsize=AUDIO_QUEUE_SIZE)
         self.text_input_queue = asyncio.Queue()
+
+        # Long-lived ElevenLabs websocket and the task reading audio from it
+        self.tts_ws = None
+        self.tts_listen_task = None
+        self.tts_ready = None
+        self.tts_last_audio = 0.0
+        self.tts_retry_at = 0.0  # after a dropped message, don't try the socket again before this
+
+        # PCM waiting to be pulled by the PortAudio callback
+        self.playback_buffer = bytearray()
+        self.playback_lock = threading.Lock()
+        self.pya = None
+        self.audio_stream = None
         
         # OpenAI-style message history
-        self.messages = [{"role": "system", "content": self.system_instruction}]
+        self.messages = [SYSTEM_MESSAGE]
+
+        # LRU of (timestamp, reply) keyed by a hash of the model, question and the message it follows
+        self.response_cache = OrderedDict()
+
+        # (start timestamp, task) keyed by (tool name, sorted args) for tools in TOOL_RESULT_TTLS;
+        # holding the task lets identical calls in flight at the same time share one run
+        self.tool_result_cache = {}
+
+        # Tool name -> implementation; sync ones run in a worker thread so gathered calls overlap
+        self.tool_impls = {
+            "get_current_datetime": self.get_current_datetime,
+        }
         
         self.tasks = []
-        self.loop = asyncio.new_event_loop()
-        self.tools = self._build_tools()
+        self.shutdown_task = None
 
     def get_current_datetime(self) -> dict:
         """Get current date and time in Asia/Jakarta timezone."""
-        tz = "Asia/Jakarta"  # hardcoded
-        dt = datetime.now(ZoneInfo(tz))
-        nice = f"It is {dt:%A}, {dt.day} {dt:%B} {dt:%Y}, {dt:%H:%M:%S} ({tz})"
+        global _DATE_CACHE
+        tz = JAKARTA_TZ.key  # hardcoded
+        dt = datetime.now(JAKARTA_TZ)
+        if _DATE_CACHE is None or dt.timestamp() >= _DATE_CACHE[0]:
+            midnight = (dt + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            _DATE_CACHE = (midnight.timestamp(), f"{dt:%A}, {dt.day} {dt:%B} {dt:%Y}")
+        nice = f"It is {_DATE_CACHE[1]}, {dt:%H:%M:%S} ({tz})"
         return {
             "text": nice,
             "iso": dt.isoformat(),
             "timezone": tz,
         }
 
-    def _build_tools(self):
-        """Build OpenAI-style tool definitions."""
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_current_datetime",
-                    "description": "Get the current date and time in Asia/Jakarta timezone.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {},
-                        "required": [],
-                    },
-                },
+    async def _dispatch_tool(self, name: str, args: dict) -> dict:
+        """Execute tool by name, reusing a fresh cached result when the tool allows it."""
+        ttl = TOOL_RESULT_TTLS.get(name)
+        if ttl is None:
+            return await self._run_tool(name, args)
+
+        now = time.monotonic()
+        expired = [k for k, (stamp, _) in self.tool_result_cache.items() if now - stamp >= TOOL_RESULT_TTLS[k[0]]]
+        for k in expired:
+            del self.tool_result_cache[k]
+
+        key = (name, orjson.dumps(args, option=orjson.OPT_SORT_KEYS))
+        entry = self.tool_result_cache.get(key)
+        if entry:
+            print(f">>> [TOOL] Reusing cached result for {name}")
+            task = entry[1]
+        else:
+            task = asyncio.ensure_future(self._run_tool(name, args))
+            self.tool_result_cache[key] = (now, task)
+        try:
+            # Shielded so one cancelled caller does not cancel the run the others are waiting on
+            return await asyncio.shield(task)
+        except Exception:
+            # Don't keep serving a failure; the next call runs the tool again
+            if self.tool_result_cache.get(key, (None, None))[1] is task:
+                del self.tool_result_cache[key]
+            raise
+
+    async def _run_tool_call(self, tc: dict) -> dict:
+        """Parses the streamed arguments of one tool call and dispatches it."""
+        name = tc["function"]["name"]
+        args = orjson.loads(tc["function"]["arguments"] or "{}")
+        if not isinstance(args, dict):
+            raise ValueError("arguments must be a JSON object")
+        print(f">>> [TOOL] Calling {name} with args: {args}")
+        return await self._dispatch_tool(name, args)
+
+    async def _run_invocation(self, inv) -> dict:
+        """Runs one batch_call entry; a malformed entry fails on its own, not the whole batch."""
+        if not isinstance(inv, dict) or not inv.get("name"):
+            raise ValueError("missing tool name")
+        args = inv.get("args") or {}
+        if not isinstance(args, dict):
+            raise ValueError("args must be an object")
+        return await self._dispatch_tool(inv["name"], args)
+
+    async def _run_tool(self, name: str, args: dict) -> dict:
+        """Run the tool implementation for name."""
+        if name == "batch_call":
+            invocations = args.get("invocations") or []
+            if not isinstance(invocations, list):
+                raise ValueError("invocations must be a list")
+            results = await asyncio.gather(
+                *[self._run_invocation(inv) for inv in invocations],
+                return_exceptions=True,
+            )
+            return {
+                str(i): {"error": str(result)} if isinstance(result, Exception) else result
+                for i, result in enumerate(results)
             }
-        ]
+        impl = self.tool_impls.get(name)
+        if impl is None:
+            raise ValueError(f"Unknown tool: {name}")
+        # get_current_datetime takes no arguments by design, so e.g. a hallucinated timezone is ignored
+        allowed = TOOL_PARAMS.get(name, set())
+        kwargs = {k: v for k, v in args.items() if k in allowed}
+        if len(kwargs) < len(args):
+            print(f">>> [TOOL] Ignoring undeclared arguments for {name}: {sorted(args.keys() - allowed)}")
+        if inspect.iscoroutinefunction(impl):
+            return await impl(**kwargs)
+        return await asyncio.to_thread(impl, **kwargs)
+
+    def _response_cache_key(self, model: str, text: str, previous: dict) -> str:
+        """
+        Hashes the model, normalized question and the message it follows into a cache key.
+        The previous reply (or summary) stands in for the context, so a follow-up like
+        "explain that again" is only reused after the same answer.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(orjson.dumps([model, " ".join(text.casefold().split()), previous.get("content") or ""]))
+        return digest.hexdigest()
+
+    def _get_cached_response(self, key: str) -> str | None:
+        """Returns a cached assistant reply if it is still fresh."""
+        entry = self.response_cache.get(key)
+        if entry is None:
+            return None
+        stamp, text = entry
+        if time.monotonic() - stamp > RESPONSE_CACHE_TTL:
+            del self.response_cache[key]
+            return None
+        self.response_cache.move_to_end(key)
+        return text
+
+    def _cache_response(self, key: str, text: str):
+        """Stores an assistant reply, evicting the least recently used entries."""
+        self.response_cache[key] = (time.monotonic(), text)
+        self.response_cache.move_to_end(key)
+        while len(self.response_cache) > RESPONSE_CACHE_SIZE:
+            self.response_cache.popitem(last=False)
+
+    async def _trim_history(self):
+        """Keeps the last few turns verbatim and folds older ones into a rolling summary."""
+        turn_starts = [i for i, m in enumerate(self.messages) if m["role"] == "user"]
+        if len(turn_starts) <= HISTORY_MAX_TURNS:
+            return
+
+        # Cut on a user message so tool calls stay paired with their results
+        cut = turn_starts[-HISTORY_KEEP_TURNS]
+        old, recent = self.messages[1:cut], self.messages[cut:]
+
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in old if m.get("content"))
+        response = await self.client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTION},
+                {"role": "user", "content": transcript},
+            ],
+        )
+        summary = (response.choices[0].message.content or "").strip()
+        self.messages[1:] = [{"role": "system", "content": f"Prior-context summary: {summary}"}] + recent
+        print(f">>> [INFO] Summarized {len(old)} old messages.")
+
+    async def _generate_response(self, model: str, use_tools: bool = True) -> str | None:
+        """Runs the streaming tool loop for the latest user message and returns the final text."""
+        final_text = None
+        if use_tools:
+            tool_kwargs = TOOL_KWARGS
+        elif any(m["role"] == "tool" for m in self.messages):
+            tool_kwargs = TOOL_KWARGS_NO_CALLS
+        else:
+            tool_kwargs = {}
+        spoken = False
+
+        # Tool loop: model -> (maybe tool call) -> tool response -> model ...
+        for _ in range(MAX_TOOL_ROUNDS):
+            content = ""
+            pending = ""
+            tool_calls = {}
+
+            stream = await self.client.chat.completions.create(
+                model=model,
+                messages=self.messages,
+                stream=True,
+                **tool_kwargs,
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+
+                # Tool calls arrive as fragments keyed by index
+                for tc in delta.tool_calls or []:
+                    call = tool_calls.setdefault(tc.index, {
+                        "id": "",
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""},
+                    })
+                    if tc.id:
+                        call["id"] = tc.id
+                    if tc.function and tc.function.name:
+                        call["function"]["name"] += tc.function.name
+                    if tc.function and tc.function.arguments:
+                        call["function"]["arguments"] += tc.function.arguments
+
+                if delta.content:
+                    content += delta.content
+                    pending += delta.content
+                    # Send complete sentences to TTS while the model keeps generating
+                    while match := SENTENCE_END_RE.search(pending):
+                        sentence = pending[:match.end()].strip()
+                        pending = pending[match.end():]
+                        await self.response_queue_tts.put(sentence)
+                        spoken = True
+
+                    # Until the first audio is queued, send a long enough clause on its own
+                    if not spoken:
+                        match = next(
+                            (m for m in CLAUSE_END_RE.finditer(pending) if m.end() >= FIRST_PHRASE_MIN_CHARS),
+                            None,
+                        )
+                        if match:
+                            await self.response_queue_tts.put(pending[:match.end()].strip())
+                            pending = pending[match.end():]
+                            spoken = True
+
+            if pending.strip():
+                await self.response_queue_tts.put(pending.strip())
+                spoken = True
+
+            # Add assistant message to history (includes tool_calls if any)
+            assistant_msg = {"role": "assistant", "content": content}
+            if tool_calls:
+                assistant_msg["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+            self.messages.append(assistant_msg)
+
+            # Check for tool calls
+            if tool_calls:
+                calls = assistant_msg["tool_calls"]
+                # Run independent calls concurrently; gather keeps the original order.
+                # A failed call becomes an error result the model can see instead of ending the turn.
+                results = await asyncio.gather(*[self._run_tool_call(tc) for tc in calls], return_exceptions=True)
+
+                for tc, tool_result in zip(calls, results):
+                    if isinstance(tool_result, Exception):
+                        tool_result = {"error": str(tool_result)}
+                    print(f">>> [TOOL] Result: {tool_result}")
+
+                    # Append tool result to messages
+                    self.messages.append({
+                        "role": "tool",
+                        "tool_call_id": tc["id"],
+                        "content": _dumps(tool_result),
+                    })
+                continue  # Loop again to get final response
+
+            # No tool calls -> this is the final answer
+            final_text = content.strip()
+            break
+
+        return final_text
+
+    async def _interrupt_playback(self):
+        """Drops whatever is still queued, playing or streaming in from the previous reply."""
+        stale_queues = (self.response_queue_tts, self.audio_in_queue_player)
+        still_speaking = (
+            any(not q.empty() for q in stale_queues)
+            or bool(self.playback_buffer)
+            or time.monotonic() - self.tts_last_audio < TTS_BARGE_IN_SECONDS
+        )
 
-    def _dispatch_tool(self, name: str, args: dict) -> dict:
-        """Execute tool by name."""
-        if name == "get_current_datetime":
-            return self.get_current_datetime()
-        raise ValueError(f"Unknown tool: {name}")
+        # Swap in fresh queues; shutting the stale ones down wakes any consumer still waiting on them
+        self.response_queue_tts = asyncio.Queue(maxsize=TTS_QUEUE_SIZE)
+        self.audio_in_queue_player = asyncio.Queue(maxsize=AUDIO_QUEUE_SIZE)
+        for q in stale_queues:
+            q.shutdown(immediate=True)
+        with self.playback_lock:
+            self.playback_buffer.clear()
+
+        if still_speaking and self.tts_ws is not None:
+            # ElevenLabs would keep streaming audio for the old reply; drop the socket so it stops
+            print(">>> [INFO] Interrupting previous reply.")
+            await self._close_tts()
 
     async def process_text_input_queue(self):
         """Processes text input sent from the GUI and sends it to the AI."""
@@ -121,64 +492,42 @@ class AI_Core(QObject):
             
             print(f">>> [INFO] Sending text to AI: '{text}'")
             
-            # Clear TTS and audio queues to prevent overlapping audio
-            for q in [self.response_queue_tts, self.audio_in_queue_player]:
-                while not q.empty():
-                    q.get_nowait()
+            # Stop the previous reply to prevent overlapping audio
+            await self._interrupt_playback()
             
+            # Answer date/time questions locally instead of spending a tool round-trip.
+            # The datetime rides on the user message so the system prefix never changes.
+            needs_date = bool(DATE_RE.search(text))
+            content = f"{text}\n\nContext: {self.get_current_datetime()['text']}" if needs_date else text
+
+            # Only send tool schemas when the message hints at a tool; plain chat can use a cheaper model
+            use_tools = not needs_date and bool(TOOL_HINT_RE.search(text))
+            model = MODEL if use_tools else CHAT_MODEL
+
             # Add user message to conversation history
-            self.messages.append({"role": "user", "content": text})
+            self.messages.append({"role": "user", "content": content})
 
             try:
-                final_text = None
-
-                # Tool loop: model -> (maybe tool call) -> tool response -> model ...
-                for _ in range(MAX_TOOL_ROUNDS):
-                    response = await asyncio.to_thread(
-                        self.client.chat.completions.create,
-                        model=MODEL,
-                        messages=self.messages,
-                        tools=self.tools,
-                        tool_choice="auto",
-                    )
-
-                    msg = response.choices[0].message
-
-                    # Add assistant message to history (includes tool_calls if any)
-                    self.messages.append(msg.model_dump(exclude_none=True))
-
-                    # Check for tool calls
-                    if msg.tool_calls:
-                        for tc in msg.tool_calls:
-                            tool_name = tc.function.name
-                            tool_args = json.loads(tc.function.arguments or "{}")
-                            
-                            print(f">>> [TOOL] Calling {tool_name} with args: {tool_args}")
-                            tool_result = self._dispatch_tool(tool_name, tool_args)
-                            print(f">>> [TOOL] Result: {tool_result}")
-
-                            # Append tool result to messages
-                            self.messages.append({
-                                "role": "tool",
-                                "tool_call_id": tc.id,
-                                "content": json.dumps(tool_result),
-                            })
-                        continue  # Loop again to get final response
-
-                    # No tool calls -> this is the final answer
-                    final_text = (msg.content or "").strip()
-                    break
+                # Date answers carry the current time, so they are never reused
+                key = None if needs_date else self._response_cache_key(model, text, self.messages[-2])
+                final_text = self._get_cached_response(key) if key else None
+                if final_text is not None:
+                    print(">>> [INFO] Using cached response.")
+                    self.messages.append({"role": "assistant", "content": final_text})
+                    await self.response_queue_tts.put(final_text)
+                else:
+                    turn_start = len(self.messages)
+                    final_text = await self._generate_response(model, use_tools=use_tools)
+                    # Only cache answers that did not go through a tool call
+                    if key and final_text and len(self.messages) == turn_start + 1:
+                        self._cache_response(key, final_text)
 
                 if not final_text:
                     final_text = "Sorry Sir, I'm having trouble fetching that right now."
+                    await self.response_queue_tts.put(final_text)
 
-                # Emit the text to GUI
+                # Emit the full text to GUI once the stream has closed
                 self.text_received.emit(final_text)
-
-                # Send to TTS
-                await self.response_queue_tts.put(final_text)
-                await self.response_queue_tts.put(None)
-
                 self.end_of_turn.emit()
 
             except Exception as e:
@@ -187,75 +536,195 @@ class AI_Core(QObject):
                 traceback.print_exc()
                 self.text_received.emit(error_msg)
                 self.end_of_turn.emit()
+            finally:
+                # Signal end of turn to TTS
+                await self.response_queue_tts.put(None)
+
+            try:
+                await self._trim_history()
+            except Exception as e:
+                print(f">>> [ERROR] History summary failed: {e}")
             
             self.text_input_queue.task_done()
 
+    async def _connect_tts(self):
+        """Opens the ElevenLabs websocket, sends the voice settings and starts the audio reader."""
+        self.tts_ws = await websockets.connect(TTS_URI)
+        await self.tts_ws.send(TTS_BOS_MESSAGE)
+        self.tts_listen_task = asyncio.create_task(self._tts_listen(self.tts_ws))
+        print(">>> [INFO] TTS websocket is open.")
+
+    async def _close_tts(self):
+        """Stops the audio reader and closes the TTS websocket, if open."""
+        if self.tts_listen_task:
+            self.tts_listen_task.cancel()
+            self.tts_listen_task = None
+        if self.tts_ws:
+            await self.tts_ws.close()
+            self.tts_ws = None
+
+    async def _tts_listen(self, websocket):
+        """Moves audio from the TTS websocket into the player queue for as long as it is open."""
+        try:
+            async for message in websocket:
+                # Binary frames are raw PCM; skip the JSON + base64 path
+                if isinstance(message, bytes):
+                    audio = message
+                else:
+                    data = orjson.loads(message)
+                    if not data.get("audio"):
+                        continue
+                    # Decode inline: binascii holds the GIL, so a worker thread would only add a hop
+                    audio = binascii.a2b_base64(data["audio"])
+                self.tts_last_audio = time.monotonic()
+                try:
+                    await self.audio_in_queue_player.put(audio)
+                except asyncio.QueueShutDown:
+                    pass  # Queue was swapped for a new turn; drop stale audio
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def _send_tts(self, message: str, queue: asyncio.Queue | None = None) -> bool:
+        """
+        Sends a message over the TTS websocket, rebuilding the connection if it has dropped.
+        Gives up after a few attempts, or once the turn that queued it is replaced, and
+        returns whether the message was sent.
+        """
+        if time.monotonic() < self.tts_retry_at:
+            return False
+        backoff = 1
+        for attempt in range(1, TTS_SEND_ATTEMPTS + 1):
+            if not self.is_running or (queue is not None and queue is not self.response_queue_tts):
+                return False
+            try:
+                if self.tts_ws is None:
+                    await self._connect_tts()
+                await self.tts_ws.send(message)
+                return True
+            except (websockets.exceptions.WebSocketException, OSError) as e:
+                print(f">>> [WARN] TTS websocket unavailable ({e}), attempt {attempt}/{TTS_SEND_ATTEMPTS}.")
+                await self._close_tts()
+                if attempt < TTS_SEND_ATTEMPTS:
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, TTS_MAX_BACKOFF_SECONDS)
+        print(f">>> [ERROR] Dropping TTS message; retrying the socket in {TTS_MAX_BACKOFF_SECONDS}s.")
+        self.tts_retry_at = time.monotonic() + TTS_MAX_BACKOFF_SECONDS
+        return False
+
     async def tts(self):
-        """Converts text responses to speech using ElevenLabs."""
-        uri = f"wss://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}/stream-input?model_id=eleven_turbo_v2&output_format=pcm_24000"
+        """Converts text responses to speech over one long-lived ElevenLabs websocket."""
+        try:
+            await self.tts_ready
+        except (websockets.exceptions.WebSocketException, OSError) as e:
+            print(f">>> [WARN] Could not open TTS websocket yet ({e}); will retry on first reply.")
+
+        # Once a sentence is dropped the rest of its turn is skipped, so the
+        # reply generator never waits on a dead socket
+        skip_queue = None
         while self.is_running:
-            text_chunk = await self.response_queue_tts.get()
-            if text_chunk is None or not self.is_running:
-                self.response_queue_tts.task_done()
+            queue = self.response_queue_tts
+            try:
+                text_chunk = await asyncio.wait_for(queue.get(), TTS_KEEPALIVE_SECONDS)
+            except TimeoutError:
+                # Keep the idle connection from timing out
+                if self.tts_ws is not None:
+                    await self._send_tts(TTS_KEEPALIVE_MESSAGE)
+                continue
+            except asyncio.QueueShutDown:
+                continue  # Queue was swapped for a new turn
+            queue.task_done()
+
+            if queue is skip_queue:
+                if text_chunk is None:
+                    skip_queue = None
                 continue
+
             try:
-                async with websockets.connect(uri) as websocket:
-                    await websocket.send(json.dumps({
-                        "text": " ",
-                        "voice_settings": {"stability": 0.5, "similarity_boost": 0.8},
-                        "xi_api_key": ELEVENLABS_API_KEY,
-                    }))
-
-                    async def listen():
-                        while self.is_running:
-                            try:
-                                message = await websocket.recv()
-                                data = json.loads(message)
-                                if data.get("audio"):
-                                    await self.audio_in_queue_player.put(base64.b64decode(data["audio"]))
-                                elif data.get("isFinal"):
-                                    break
-                            except websockets.exceptions.ConnectionClosed:
-                                break
-
-                    listen_task = asyncio.create_task(listen())
-                    
-                    # Send the entire text at once
-                    await websocket.send(json.dumps({"text": text_chunk + " "}))
-                    
-                    # Signal end of text
-                    await websocket.send(json.dumps({"text": ""}))
-                    self.response_queue_tts.task_done()
-
-                    await listen_task
+                if text_chunk is None:
+                    # End of turn: flush buffered audio without closing the socket
+                    await self._send_tts(TTS_FLUSH_MESSAGE, queue)
+                elif not await self._send_tts(
+                    _dumps({"text": text_chunk + " ", "try_trigger_generation": True}), queue
+                ):
+                    skip_queue = queue
             except Exception as e:
                 print(f">>> [ERROR] TTS Error: {e}")
-                self.response_queue_tts.task_done()
 
-    async def play_audio(self):
-        """Plays audio from TTS using PyAudio."""
-        import pyaudio
-        pya = pyaudio.PyAudio()
-        stream = await asyncio.to_thread(
-            pya.open,
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=RECEIVE_SAMPLE_RATE,
-            output=True
-        )
+    def _playback_callback(self, in_data, frame_count, time_info, status):
+        """Runs on the PortAudio thread; pads with silence when the buffer runs dry."""
+        size = frame_count * 2
+        with self.playback_lock:
+            # Copy straight out of the buffer through a view instead of slicing it twice
+            with memoryview(self.playback_buffer) as view:
+                data = view[:size].tobytes()
+            del self.playback_buffer[:size]
+        if len(data) < size:
+            data += bytes(size - len(data))
+        return data, pyaudio.paContinue
+
+    def _init_audio(self):
+        """Creates PyAudio and opens the callback output stream (blocking; run in a thread)."""
+        self.pya = pyaudio.PyAudio()
+        try:
+            self.audio_stream = self.pya.open(
+                format=pyaudio.paInt16,
+                channels=1,
+                rate=RECEIVE_SAMPLE_RATE,
+                output=True,
+                frames_per_buffer=PLAYBACK_FRAMES_PER_BUFFER,
+                stream_callback=self._playback_callback,
+            )
+        except Exception:
+            self._close_audio()
+            raise
         print(">>> [INFO] Audio output stream is open.")
-        while self.is_running:
-            bytestream = await self.audio_in_queue_player.get()
-            if bytestream and self.is_running:
-                await asyncio.to_thread(stream.write, bytestream)
-            self.audio_in_queue_player.task_done()
-        stream.stop_stream()
-        stream.close()
-        pya.terminate()
+
+    def _close_audio(self):
+        """Stops the output stream and releases PyAudio."""
+        if self.audio_stream:
+            self.audio_stream.stop_stream()
+            self.audio_stream.close()
+            self.audio_stream = None
+        if self.pya:
+            self.pya.terminate()
+            self.pya = None
+
+    async def play_audio(self):
+        """Moves TTS audio into the buffer read by the PyAudio callback stream (or discards it if there is none)."""
+        try:
+            while self.is_running:
+                # Leave audio in the bounded queue while the buffer is full, so the websocket reader waits
+                while self.is_running and len(self.playback_buffer) > PLAYBACK_BUFFER_MAX_BYTES:
+                    await asyncio.sleep(PLAYBACK_FRAMES_PER_BUFFER / RECEIVE_SAMPLE_RATE)
+                queue = self.audio_in_queue_player
+                try:
+                    chunks = [await queue.get()]
+                except asyncio.QueueShutDown:
+                    continue  # Queue was swapped for a new turn
+                # Coalesce chunks that are already waiting into one buffer update
+                while len(chunks) < PLAYBACK_COALESCE_CHUNKS and not queue.empty():
+                    chunks.append(queue.get_nowait())
+                bytestream = b"".join(chunk for chunk in chunks if chunk)
+                # Without an output stream keep draining, so the websocket reader never blocks
+                if bytestream and self.is_running and self.audio_stream:
+                    with self.playback_lock:
+                        self.playback_buffer.extend(bytestream)
+                for _ in chunks:
+                    queue.task_done()
+        finally:
+            self._close_audio()
 
     async def main_task_runner(self):
         """Creates and gathers all main async tasks."""
         print(">>> [INFO] Starting all backend tasks...")
+        # Open the TTS socket in the background so the handshake overlaps audio setup
+        # and the user's first message instead of the first reply
+        self.tts_ready = asyncio.create_task(self._connect_tts())
+        try:
+            await asyncio.to_thread(self._init_audio)
+        except Exception as e:
+            # Text chat still works without a speaker
+            print(f">>> [ERROR] Could not open audio output ({e}); continuing without speech.")
         self.tasks.append(asyncio.create_task(self.tts()))
         self.tasks.append(asyncio.create_task(self.play_audio()))
         self.tasks.append(asyncio.create_task(self.process_text_input_queue()))
@@ -272,17 +741,16 @@ class AI_Core(QObject):
         finally:
             if self.is_running:
                 self.stop()
-
-    def start_event_loop(self):
-        """Starts the asyncio event loop."""
-        asyncio.set_event_loop(self.loop)
-        self.loop.run_until_complete(self.run())
+            # The tasks above return as soon as they are cancelled; wait for the
+            # sockets to close too, so the loop never exits mid-shutdown
+            await self.shutdown_task
 
     @Slot(str)
     def handle_user_text(self, text):
         """This slot receives the text from GUI signal and puts it in the async queue."""
-        if self.is_running and self.loop.is_running():
-            asyncio.run_coroutine_threadsafe(self.text_input_queue.put(text), self.loop)
+        # Same thread and loop as the backend, and the queue is unbounded, so no await is needed
+        if self.is_running:
+            self.text_input_queue.put_nowait(text)
 
     async def shutdown_async_tasks(self):
         """Coroutine to cancel all running tasks."""
@@ -291,18 +759,19 @@ class AI_Core(QObject):
             await self.text_input_queue.put(None)
         for task in self.tasks:
             task.cancel()
-        await asyncio.sleep(0.1)
+        if self.tts_ready:
+            self.tts_ready.cancel()
+        # Wait exactly as long as the tasks take to unwind, then release the sockets
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self._close_tts()
+        await self.client.close()
         print(">>> [DEBUG] Async tasks shutdown complete.")
 
     def stop(self):
-        """Thread-safe method to stop the asyncio loop and tasks."""
-        if self.is_running and self.loop.is_running():
+        """Schedules shutdown of the async tasks; run() returns once they are done."""
+        if self.is_running:
             self.is_running = False
-            future = asyncio.run_coroutine_threadsafe(self.shutdown_async_tasks(), self.loop)
-            try:
-                future.result(timeout=5)
-            except Exception as e:
-                print(f">>> [ERROR] Timeout or error during async shutdown: {e}")
+            self.shutdown_task = asyncio.ensure_future(self.shutdown_async_tasks())
 
 # ====
 # GUI APPLICATION
@@ -329,6 +798,9 @@ class MainWindow(QMainWindow):
         self.text_display.setStyleSheet("""
             QTextEdit { background-color: #0000; color: #a9b7c6;
                     font-size: 16px; border: 1px solid #555; border-radius: 5px; }""")
+        # Cap the history so long chats don't grow the document without bound
+        self.text_display.document().setMaximumBlockCount(CHAT_MAX_BLOCKS)
+        self.text_cursor = QTextCursor(self.text_display.document())
         self.main_layout.addWidget(self.text_display)
 
         # Input Box
@@ -341,32 +813,36 @@ class MainWindow(QMainWindow):
         self.main_layout.addWidget(self.input_box)
         self.input_box.setFocus()
 
-        self.setup_backend_thread()
+        self.setup_backend()
 
-    def setup_backend_thread(self):
+    def setup_backend(self):
         self.ai_core = AI_Core()
         self.user_text_submitted.connect(self.ai_core.handle_user_text)
         self.ai_core.text_received.connect(self.update_text)
         self.ai_core.end_of_turn.connect(self.add_newline)
 
-        self.backend_thread = threading.Thread(target=self.ai_core.start_event_loop)
-        self.backend_thread.daemon = True
-        self.backend_thread.start()
-
     def send_user_text(self):
         """This function is called when the user presses Enter in the input box."""
         text = self.input_box.text().strip()
         if text:
-            self.text_display.append(f"<b style='color:#6DAEED;'>You:</b> {text}")
+            self.append_message(f"<b style='color:#6DAEED;'>You:</b> {html.escape(text)}")
             self.user_text_submitted.emit(text)
             self.input_box.clear()
             self.input_box.setFocus()
 
+    def append_message(self, message_html):
+        """Inserts a message at the end of the chat through the shared cursor and scrolls to it."""
+        self.text_cursor.movePosition(QTextCursor.MoveOperation.End)
+        if not self.text_display.document().isEmpty():
+            self.text_cursor.insertBlock()
+        self.text_cursor.insertHtml(message_html)
+        self.text_display.setTextCursor(self.text_cursor)
+        self.text_display.ensureCursorVisible()
+
     @Slot(str)
     def update_text(self, text):
         """Displays the complete response from Jarvis."""
-        self.text_display.append(f"<b style='color:#A9B7C6;'>Jarvis:</b> {text}")
-        self.text_display.verticalScrollBar().setValue(self.text_display.verticalScrollBar().maximum())
+        self.append_message(f"<b style='color:#A9B7C6;'>Jarvis:</b> {html.escape(text)}")
 
     @Slot()
     def add_newline(self):
@@ -381,12 +857,21 @@ class MainWindow(QMainWindow):
 # ====
 # MAIN EXECUTION
 # ====
+async def main_async():
+    """Shows the window and runs the backend until it shuts down."""
+    window = MainWindow()
+    window.show()
+    await window.ai_core.run()
+
 if __name__ == "__main__":
     try:
         app = QApplication(sys.argv)
-        window = MainWindow()
-        window.show()
-        sys.exit(app.exec())
+        # Exit once the backend has finished shutting down, not when the window closes
+        app.setQuitOnLastWindowClosed(False)
+        loop = QEventLoop(app)
+        asyncio.set_event_loop(loop)
+        with loop:
+            loop.run_until_complete(main_async())
     except KeyboardInterrupt:
         print(">>> [INFO] Application interrupted by user.")
     finally: